@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# src.database needs DATABASE_URL at import time and src.storage creates
+# uploads/ in the working directory, so both point at a scratch directory.
+WORK_DIR = tempfile.mkdtemp(prefix="ghostdrop-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORK_DIR, 'app.db')}")
+os.chdir(WORK_DIR)
@@ -0,0 +1,110 @@
+import os
+import secrets
+import httpx
+from fastapi import HTTPException, Request
+from fastapi.responses import RedirectResponse, StreamingResponse
+from starlette import status
+from starlette.background import BackgroundTask
+
+# Node-affinity routing: with AFFINITY_MODE set to "redirect" or "proxy" every
+# replica keeps its uploads on local disk and its own database, and the token
+# carries the node that owns the file, e.g. "app2.<random>". A download that
+# lands on another replica is sent back to the owner. The default "shared"
+# mode keeps the old behaviour where all replicas share uploads and app.db.
+NODE_ID = os.getenv("NODE_ID", "")
+AFFINITY_MODE = os.getenv("AFFINITY_MODE", "shared")
+AFFINITY_MODES = ("shared", "proxy", "redirect")
+
+# NODE_URLS=app1=http://app1:8000,app2=http://app2:8000,...
+NODE_URLS = dict(
+    entry.strip().split("=", 1)
+    for entry in os.getenv("NODE_URLS", "").split(",")
+    if "=" in entry
+)
+
+RELAY_HEADER = "x-ghostdrop-relayed"
+FORWARDED_HEADERS = ("content-type", "content-length", "content-disposition")
+
+_client = None
+
+
+def check_config():
+    # without a valid NODE_ID tokens would lose their owner and cross-node
+    # downloads would quietly 404, so refuse to start instead
+    if AFFINITY_MODE not in AFFINITY_MODES:
+        raise RuntimeError(
+            f"AFFINITY_MODE must be one of {', '.join(AFFINITY_MODES)}, got {AFFINITY_MODE!r}"
+        )
+    if AFFINITY_MODE == "shared":
+        return
+    if not NODE_ID:
+        raise RuntimeError(f"NODE_ID must be set when AFFINITY_MODE={AFFINITY_MODE}")
+    if NODE_ID not in NODE_URLS:
+        raise RuntimeError(f"NODE_ID {NODE_ID!r} is not listed in NODE_URLS")
+
+
+def new_token():
+    token = secrets.token_urlsafe(32)
+    if NODE_ID and AFFINITY_MODE != "shared":
+        return f"{NODE_ID}.{token}"
+    return token
+
+
+def owner_of(token: str):
+    # token_urlsafe never contains ".", so anything before it is the node id
+    node, sep, _ = token.partition(".")
+    return node if sep else None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=httpx.Timeout(30.0))
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def relay(url: str):
+    client = get_client()
+    try:
+        upstream = await client.send(
+            client.build_request("GET", url, headers={RELAY_HEADER: NODE_ID or "1"}),
+            stream=True,
+        )
+    except httpx.TransportError as e:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Node holding this file is unreachable: {type(e).__name__}",
+        )
+    headers = {
+        name: upstream.headers[name]
+        for name in FORWARDED_HEADERS
+        if name in upstream.headers
+    }
+    # raw chunks are passed straight through without buffering the file
+    return StreamingResponse(
+        upstream.aiter_raw(),
+        status_code=upstream.status_code,
+        headers=headers,
+        background=BackgroundTask(upstream.aclose),
+    )
+
+
+async def route_to_owner(request: Request, token: str):
+    """Returns a response sending the download to the owning node, or None when
+    this replica should serve it itself."""
+    if AFFINITY_MODE == "shared" or request.headers.get(RELAY_HEADER):
+        return None
+    owner = owner_of(token)
+    if not owner or owner == NODE_ID or owner not in NODE_URLS:
+        return None
+    url = f"{NODE_URLS[owner].rstrip('/')}{request.url.path}"
+    if AFFINITY_MODE == "redirect":
+        return RedirectResponse(url, status_code=307)
+    return await relay(url)
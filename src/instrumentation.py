@@ -0,0 +1,194 @@
+import asyncio
+import itertools
+import os
+import secrets
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # profiling is optional
+    Profiler = None
+
+# Opt-in instrumentation that is cheap enough to leave on in production:
+# - LoopLagMonitor records event loop stalls with the stack that blocked it
+#   (LOOP_LAG_THRESHOLD_MS=0 turns it off)
+# - RequestProfiler writes a pyinstrument profile for requests carrying the
+#   X-Profile header (only when PROFILE_TOKEN is set and matches)
+# - TransferTracker keeps the in-flight uploads/downloads for /debug/transfers,
+#   which is only mounted when DEBUG_TOKEN is set
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))
+LOOP_LAG_INTERVAL_MS = float(os.getenv("LOOP_LAG_INTERVAL_MS", "50"))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN")
+
+if PROFILE_TOKEN and Profiler is None:
+    print("Warning: PROFILE_TOKEN is set but pyinstrument is not installed, request profiling is disabled")
+
+MAX_STALLS = 100
+
+TRANSFER_PATHS = (
+    "/file/upload-file",
+    "/file/via-email/",
+    "/file/download-file/",
+    "/group-mail/download/",
+)
+
+
+def _is_transfer(scope):
+    if scope["path"] == "/group-mail/":
+        return scope["method"] == "POST"
+    return scope["path"].startswith(TRANSFER_PATHS)
+
+
+class LoopLagMonitor:
+    """A heartbeat task on the loop plus a watchdog thread. When the heartbeat
+    is late by more than the threshold the watchdog grabs the loop thread's
+    stack, and the heartbeat records the stall once the loop is free again."""
+
+    def __init__(self, threshold_ms=LOOP_LAG_THRESHOLD_MS, interval_ms=LOOP_LAG_INTERVAL_MS):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.stalls = deque(maxlen=MAX_STALLS)
+        self._last_tick = time.monotonic()
+        self._stack = None
+        self._loop_thread = None
+        self._task = None
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self):
+        return self.threshold > 0
+
+    def start(self):
+        if not self.enabled:
+            return
+        self._loop_thread = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = now - self._last_tick - self.interval
+            if lag > self.threshold:
+                self.stalls.append(
+                    {
+                        "at": datetime.now(timezone.utc).isoformat(),
+                        "lag_ms": round(lag * 1000, 1),
+                        "stack": self._stack or [],
+                    }
+                )
+            self._last_tick = now
+            self._stack = None
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            late = time.monotonic() - self._last_tick - self.interval
+            if late > self.threshold and self._stack is None:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is not None:
+                    self._stack = traceback.format_stack(frame)
+
+
+loop_monitor = LoopLagMonitor()
+
+
+class RequestProfiler:
+    """ASGI middleware profiling single requests sent with X-Profile: <PROFILE_TOKEN>."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope):
+            return await self.app(scope, receive, send)
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.stop()
+            # rendering and writing the profile would stall the loop it measures
+            await asyncio.to_thread(self._write, profiler, scope["method"])
+
+    @staticmethod
+    def _write(profiler, method):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        # the path is left out of the name since it can carry a download token
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}_{method}_{uuid.uuid4().hex}.html"
+        with open(os.path.join(PROFILE_DIR, name), "w") as f:
+            f.write(profiler.output_html())
+
+    @staticmethod
+    def _requested(scope):
+        if Profiler is None or not PROFILE_TOKEN:
+            return False
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                return secrets.compare_digest(value, PROFILE_TOKEN.encode())
+        return False
+
+
+in_flight = {}
+_transfer_ids = itertools.count(1)
+
+
+def _display_path(path: str):
+    # download tokens are secrets, keep them out of the debug listing
+    if "download" in path:
+        return f"{path.rsplit('/', 1)[0]}/<token>"
+    return path
+
+
+class TransferTracker:
+    """ASGI middleware counting request and response body bytes of uploads and
+    downloads while they are in flight."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _is_transfer(scope):
+            return await self.app(scope, receive, send)
+
+        transfer_id = next(_transfer_ids)
+        entry = {
+            "id": transfer_id,
+            "method": scope["method"],
+            "path": _display_path(scope["path"]),
+            "started": datetime.now(timezone.utc).isoformat(),
+            "bytes_received": 0,
+            "bytes_sent": 0,
+        }
+        in_flight[transfer_id] = entry
+
+        async def tracked_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                entry["bytes_received"] += len(message.get("body", b""))
+            return message
+
+        async def tracked_send(message):
+            if message["type"] == "http.response.body":
+                entry["bytes_sent"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, tracked_receive, tracked_send)
+        finally:
+            in_flight.pop(transfer_id, None)
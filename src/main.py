@@ -1,13 +1,18 @@
 from fastapi import FastAPI,HTTPException,status
 from .database import engine,sessionLocal
 from .models import Base,GroupShare,Share
-from .routers import file_share,group_share
+from .routers import file_share,group_share,debug
+from .affinity import check_config,close_client
+from .instrumentation import DEBUG_TOKEN,RequestProfiler,TransferTracker,loop_monitor
+from .storage import current_bucket,drop_expired_files,drop_expired_rows,ensure_partitions,upgrade_schema
 from datetime import datetime,timezone
 from contextlib import asynccontextmanager
 import asyncio
 import os
 
+check_config()
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
 
 
 async def auto_cleanup_Share():
@@ -15,11 +20,17 @@ async def auto_cleanup_Share():
         db=sessionLocal()
         try:
             current_datetime=datetime.now(timezone.utc)
-            expired_files=db.query(Share).filter(Share.expires<current_datetime).all()
+            before=current_bucket()
+            # whole hours that have passed go in one directory removal and one partition drop
+            await asyncio.to_thread(drop_expired_files,before)
+            drop_expired_rows(db,"filestorage",before)
+            ensure_partitions(db)
+            # only the current hour is left to expire row by row
+            expired_files=db.query(Share).filter(Share.expiry_bucket==before,Share.expires<current_datetime).all()
             for file in expired_files:
                 if file.file_path and os.path.exists(file.file_path):
                     os.remove(file.file_path)
-            db.query(Share).filter(Share.expires<current_datetime).delete(synchronize_session=False)
+            db.query(Share).filter(Share.expiry_bucket==before,Share.expires<current_datetime).delete(synchronize_session=False)
             db.commit()
         except Exception as e:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,detail=f"{e} occured")
@@ -32,7 +43,9 @@ async def auto_cleanup_GroupShare():
         db=sessionLocal()
         try:
             current_datetime=datetime.now(timezone.utc)
-            db.query(GroupShare).filter(GroupShare.expires<current_datetime).delete()
+            before=current_bucket()
+            drop_expired_rows(db,"grouptable",before)
+            db.query(GroupShare).filter(GroupShare.expiry_bucket==before,GroupShare.expires<current_datetime).delete()
             db.commit()
         except Exception as e:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,detail=f"{e} occured")
@@ -42,15 +55,27 @@ async def auto_cleanup_GroupShare():
     
 @asynccontextmanager
 async def lifespan(app:FastAPI):
+    db=sessionLocal()
+    try:
+        ensure_partitions(db)
+    finally:
+        db.close()
     task=asyncio.create_task(auto_cleanup_GroupShare())
     task2=asyncio.create_task(auto_cleanup_Share())
+    loop_monitor.start()
     yield
+    loop_monitor.stop()
     task.cancel()
     task2.cancel()
+    await close_client()
 
 app = FastAPI(lifespan=lifespan)
 app.include_router(file_share.router)
 app.include_router(group_share.router)
+if DEBUG_TOKEN:
+    app.include_router(debug.router)
+app.add_middleware(TransferTracker)
+app.add_middleware(RequestProfiler)
 
 @app.get('/')
 async def home():
@@ -1,24 +1,39 @@
-from sqlalchemy import Column,Integer,String,DateTime,ForeignKey
+from sqlalchemy import Column,Integer,String,DateTime,ForeignKey,UniqueConstraint
 from .database import Base
-from datetime import timezone,datetime,timedelta
+from .storage import PARTITIONED,default_expiry
+from .affinity import new_token
+from datetime import timezone,datetime
 
-import secrets
+
+def _partition_args():
+    # a partitioned Postgres table needs the bucket in every unique key, and the
+    # grouptable -> filestorage link is kept by the app since both rows share a bucket
+    if not PARTITIONED:
+        return ()
+    return (
+        UniqueConstraint("token","expiry_bucket"),
+        {"postgresql_partition_by":"LIST (expiry_bucket)"},
+    )
 
 class Share(Base):
     __tablename__="filestorage"
-    id=Column(Integer,primary_key=True,index=True)
+    __table_args__=_partition_args()
+    id=Column(Integer,primary_key=True,index=True,autoincrement=True)
     file_name=Column(String)
     file_path=Column(String)
-    token=Column(String,unique=True,index=True,default=lambda: secrets.token_urlsafe(32))
+    token=Column(String,unique=not PARTITIONED,index=True,default=new_token)
     created=Column(DateTime,default=lambda: datetime.now(timezone.utc))
-    expires=Column(DateTime,default=lambda: datetime.now(timezone.utc) + timedelta(hours=24))
+    expires=Column(DateTime,default=default_expiry)
+    expiry_bucket=Column(Integer,primary_key=PARTITIONED,index=True,nullable=False)
     file_type=Column(String)
 
 class GroupShare(Base):
     __tablename__="grouptable"
-    id=Column(Integer,primary_key=True,index=True)
-    share_id=Column(Integer,ForeignKey('filestorage.id'))
+    __table_args__=_partition_args()
+    id=Column(Integer,primary_key=True,index=True,autoincrement=True)
+    share_id=Column(Integer,index=True) if PARTITIONED else Column(Integer,ForeignKey('filestorage.id'))
     receiver_email=Column(String)
-    token=Column(String,unique=True,index=True,default=lambda: secrets.token_urlsafe(32))
+    token=Column(String,unique=not PARTITIONED,index=True,default=new_token)
     created=Column(DateTime,default=lambda: datetime.now(timezone.utc))
-    expires=Column(DateTime,default=lambda: datetime.now(timezone.utc) + timedelta(hours=24))
\ No newline at end of file
+    expires=Column(DateTime,default=default_expiry)
+    expiry_bucket=Column(Integer,primary_key=PARTITIONED,index=True,nullable=False)
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Header, HTTPException
+from starlette import status
+from typing import Optional
+from .. import instrumentation
+from ..instrumentation import in_flight, loop_monitor
+import secrets
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+
+def check_token(token: Optional[str]):
+    # the router is only mounted with DEBUG_TOKEN set, this guards it regardless
+    if not instrumentation.DEBUG_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not token or not secrets.compare_digest(token.encode(), instrumentation.DEBUG_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid debug token")
+
+
+@router.get("/transfers")
+async def list_transfers(x_debug_token: Optional[str] = Header(default=None)):
+    check_token(x_debug_token)
+    return {"in_flight": list(in_flight.values())}
+
+
+@router.get("/loop-lag")
+async def list_loop_stalls(x_debug_token: Optional[str] = Header(default=None)):
+    check_token(x_debug_token)
+    return {
+        "threshold_ms": loop_monitor.threshold * 1000,
+        "stalls": list(loop_monitor.stalls),
+    }
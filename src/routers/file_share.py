@@ -5,11 +5,14 @@ from fastapi import (
     Form,
     BackgroundTasks,
     HTTPException,
+    Request,
 )
 from fastapi.responses import FileResponse
 from starlette import status
 from ..database import sessionLocal
 from ..models import Share,GroupShare
+from ..affinity import route_to_owner
+from ..storage import bucket_for,bucket_path,default_expiry
 from typing import Annotated,List
 from sqlalchemy.orm import Session
 import os
@@ -32,9 +35,6 @@ def get_db():
         db.close()
 
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
 router = APIRouter(prefix="/file", tags=["file"])
 
 db_dependency = Annotated[Session, Depends(get_db)]
@@ -119,8 +119,10 @@ async def core_share(
 
     unique_name = f"{str(uuid.uuid4())}_{new_title}"
 
-    # created a path to store the uploaded file below
-    file_path = os.path.join(UPLOAD_DIR, unique_name)
+    # the file goes into the directory of the hour it expires in
+    expires = default_expiry()
+    expiry_bucket = bucket_for(expires)
+    file_path = bucket_path(expiry_bucket, unique_name)
     
     current_size = 0
     with open(f"{file_path}", "wb") as f:
@@ -142,7 +144,13 @@ async def core_share(
         )
         
     # added the file name and path into DB
-    new_file = Share(file_name=new_title, file_path=file_path, file_type=file_type)
+    new_file = Share(
+        file_name=new_title,
+        file_path=file_path,
+        file_type=file_type,
+        expires=expires,
+        expiry_bucket=expiry_bucket,
+    )
     db.add(new_file)
     db.commit()
     db.refresh(new_file)
@@ -190,8 +198,12 @@ async def upload_file(
 
 @router.get("/download-file/{token}")
 async def download_file(
-    db: db_dependency, background_tasks: BackgroundTasks, token: str
+    db: db_dependency, background_tasks: BackgroundTasks, token: str, request: Request
 ):
+    owner_response = await route_to_owner(request, token)
+    if owner_response:
+        return owner_response
+
     filerequest = db.query(Share).filter(Share.token == token).first()
     if not filerequest:
         raise HTTPException(status_code=404, detail="File Not Found")
@@ -5,11 +5,14 @@ from fastapi import (
     Form,
     BackgroundTasks,
     HTTPException,
+    Request,
 )
 from fastapi.responses import FileResponse
 from starlette import status
 from ..database import sessionLocal
 from ..models import Share, GroupShare
+from ..affinity import route_to_owner
+from ..storage import bucket_for, bucket_path, default_expiry
 from typing import Annotated, List
 from sqlalchemy.orm import Session
 import os
@@ -24,7 +27,6 @@ from dotenv import load_dotenv
 from .file_share import (
     ALLOWED_EXTENSIONS,
     MAXIMUM_FILE_SIZE,
-    UPLOAD_DIR,
 )
 
 
@@ -153,7 +155,10 @@ async def group_share(
     new_title = f"{titlerequest}{file_type}"
 
     unique_name = f"{str(uuid.uuid4())}_{new_title}"
-    file_path = os.path.join(UPLOAD_DIR, unique_name)
+    # the file and all recipient rows share one expiry bucket
+    expires = default_expiry()
+    expiry_bucket = bucket_for(expires)
+    file_path = bucket_path(expiry_bucket, unique_name)
     if file_type not in ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -184,6 +189,8 @@ async def group_share(
             file_name=new_title,
             file_path=file_path,
             file_type=file_type,
+            expires=expires,
+            expiry_bucket=expiry_bucket,
         )
         db.add(new_file_record)
         db.commit()
@@ -192,6 +199,8 @@ async def group_share(
             new_record = GroupShare(
                 receiver_email=email,
                 share_id=new_file_record.id,
+                expires=expires,
+                expiry_bucket=expiry_bucket,
             )
             db.add(new_record)
             recipient_Records.append(new_record)
@@ -306,8 +315,12 @@ async def group_share_using_GS(
 
 @router.get("/download/{token}")
 async def downlaod_group_shared_file(
-    db: db_dependency, token: str, background_tasks: BackgroundTasks
+    db: db_dependency, token: str, background_tasks: BackgroundTasks, request: Request
 ):
+    owner_response = await route_to_owner(request, token)
+    if owner_response:
+        return owner_response
+
     group_request = db.query(GroupShare).filter(GroupShare.token == token).first()
     if not group_request:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,detail="You have already finished downloading the file,token expired")
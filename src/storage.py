@@ -0,0 +1,158 @@
+import os
+import shutil
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import DateTime, Integer, String, inspect, text
+from sqlalchemy.exc import DBAPIError
+from .database import engine
+
+# Uploads are laid out as UPLOAD_DIR/<expiry bucket>/<uuid>_<title> and the
+# share tables carry the same bucket, so a whole expiry hour can be dropped at
+# once instead of unlinking files and deleting rows one by one.
+UPLOAD_DIR = "uploads"
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+EXPIRY_HOURS = 24
+
+# Postgres gets real LIST partitions per bucket, anything else (SQLite) falls
+# back to an indexed bucket column cleared with a single DELETE.
+PARTITIONED = engine.dialect.name == "postgresql"
+
+SHARE_TABLES = ("grouptable", "filestorage")
+
+
+def default_expiry():
+    return datetime.now(timezone.utc) + timedelta(hours=EXPIRY_HOURS)
+
+
+def bucket_for(expires: datetime) -> int:
+    # hour the record expires in, e.g. 2025010113
+    if expires.tzinfo is None:
+        expires = expires.replace(tzinfo=timezone.utc)
+    return int(expires.astimezone(timezone.utc).strftime("%Y%m%d%H"))
+
+
+def current_bucket() -> int:
+    return bucket_for(datetime.now(timezone.utc))
+
+
+def bucket_path(bucket: int, unique_name: str) -> str:
+    bucket_dir = os.path.join(UPLOAD_DIR, str(bucket))
+    os.makedirs(bucket_dir, exist_ok=True)
+    return os.path.join(bucket_dir, unique_name)
+
+
+def ensure_partitions(db):
+    """Creates the partitions for every bucket an upload made from now until the
+    next cleanup run can land in, so uploads never run DDL themselves."""
+    if not PARTITIONED:
+        return
+    now = datetime.now(timezone.utc)
+    for hours in range(EXPIRY_HOURS + 2):
+        bucket = bucket_for(now + timedelta(hours=hours))
+        for table in SHARE_TABLES:
+            try:
+                db.execute(
+                    text(
+                        f"CREATE TABLE IF NOT EXISTS {table}_p{bucket} "
+                        f"PARTITION OF {table} FOR VALUES IN ({bucket})"
+                    )
+                )
+                db.commit()
+            except DBAPIError:
+                # another replica created the same partition concurrently
+                db.rollback()
+
+
+def upgrade_schema(bind=engine):
+    """Adds and backfills expiry_bucket on databases created before it existed.
+    SQLite tables are upgraded in place and their files moved into bucket
+    directories; an old unpartitioned Postgres schema cannot be converted."""
+    if bind.dialect.name == "postgresql":
+        inspector = inspect(bind)
+        for table in SHARE_TABLES:
+            columns = {column["name"] for column in inspector.get_columns(table)}
+            if "expiry_bucket" not in columns:
+                raise RuntimeError(
+                    f"Table {table} has no expiry_bucket column. Recreate the share "
+                    "tables so they can be created as partitioned tables."
+                )
+        return
+    for table in reversed(SHARE_TABLES):
+        with bind.connect() as conn:
+            # replicas sharing one app.db start together, so take the write lock
+            # before looking at the columns and let only the first one upgrade
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            columns = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+            if "expiry_bucket" in columns:
+                conn.rollback()
+                continue
+            _backfill_expiry_bucket(conn, table)
+            conn.commit()
+
+
+def _backfill_expiry_bucket(conn, table: str):
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN expiry_bucket INTEGER"))
+    conn.execute(text(f"CREATE INDEX ix_{table}_expiry_bucket ON {table} (expiry_bucket)"))
+    types = {"id": Integer, "expires": DateTime}
+    if table == "filestorage":
+        types["file_path"] = String
+    query = text(f"SELECT {', '.join(types)} FROM {table}").columns(**types)
+    for row in conn.execute(query).mappings().all():
+        values = {"id": row["id"], "bucket": bucket_for(row["expires"] or default_expiry())}
+        file_path = row.get("file_path")
+        if not file_path:
+            conn.execute(
+                text(f"UPDATE {table} SET expiry_bucket = :bucket WHERE id = :id"),
+                values,
+            )
+            continue
+        values["file_path"] = bucket_path(values["bucket"], os.path.basename(file_path))
+        try:
+            os.replace(file_path, values["file_path"])
+        except FileNotFoundError:
+            pass  # already moved, or the file is gone and cleanup drops the row
+        conn.execute(
+            text(f"UPDATE {table} SET expiry_bucket = :bucket, file_path = :file_path WHERE id = :id"),
+            values,
+        )
+
+
+def expired_dir_buckets(before: int) -> list:
+    buckets = []
+    for entry in os.listdir(UPLOAD_DIR):
+        if entry.isdigit() and int(entry) < before:
+            buckets.append(int(entry))
+    return buckets
+
+
+def drop_expired_files(before: int):
+    # every file in a bucket older than the current hour has expired
+    for bucket in expired_dir_buckets(before):
+        shutil.rmtree(os.path.join(UPLOAD_DIR, str(bucket)), ignore_errors=True)
+
+
+def _partition_buckets(db, table: str) -> list:
+    rows = db.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :parent"
+        ),
+        {"parent": table},
+    ).scalars()
+    prefix = f"{table}_p"
+    return [int(name[len(prefix):]) for name in rows if name.startswith(prefix)]
+
+
+def drop_expired_rows(db, table: str, before: int):
+    if PARTITIONED:
+        for bucket in _partition_buckets(db, table):
+            if bucket < before:
+                db.execute(text(f"DROP TABLE IF EXISTS {table}_p{bucket}"))
+    else:
+        db.execute(
+            text(f"DELETE FROM {table} WHERE expiry_bucket < :before"),
+            {"before": before},
+        )
+    db.commit()
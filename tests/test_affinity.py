@@ -0,0 +1,145 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+
+from src import affinity
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_nodes(tmp_path, mode):
+    """Starts n1 and n2 as separate uvicorn processes, each with its own working
+    directory (uploads/) and SQLite database. n3 is listed but never started."""
+    urls = {name: f"http://127.0.0.1:{free_port()}" for name in ("n1", "n2", "n3")}
+    node_urls = ",".join(f"{name}={url}" for name, url in urls.items())
+    processes = []
+    for name in ("n1", "n2"):
+        work_dir = tmp_path / name
+        work_dir.mkdir()
+        env = dict(
+            os.environ,
+            PYTHONPATH=REPO_ROOT,
+            DATABASE_URL=f"sqlite:///{work_dir / 'app.db'}",
+            NODE_ID=name,
+            NODE_URLS=node_urls,
+            AFFINITY_MODE=mode,
+        )
+        port = urls[name].rsplit(":", 1)[1]
+        processes.append(
+            subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "src.main:app", "--port", port],
+                cwd=work_dir,
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        )
+    for name in ("n1", "n2"):
+        deadline = time.monotonic() + 20
+        while True:
+            try:
+                httpx.get(f"{urls[name]}/")
+                break
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+    return urls, processes
+
+
+@pytest.fixture(params=["proxy", "redirect"])
+def nodes(request, tmp_path):
+    urls, processes = start_nodes(tmp_path, request.param)
+    yield request.param, urls
+    for process in processes:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def upload(url, content=b"hello from n1"):
+    response = httpx.post(
+        f"{url}/file/upload-file",
+        files={"fileupload": ("note.txt", content)},
+        data={"title": "note"},
+    )
+    assert response.status_code == 200
+    return response.json()["Download token"]
+
+
+def download(url, token, follow_redirects=True):
+    return httpx.get(f"{url}/file/download-file/{token}", follow_redirects=follow_redirects)
+
+
+def test_download_through_other_node(nodes):
+    mode, urls = nodes
+    token = upload(urls["n1"])
+    assert token.startswith("n1.")
+
+    if mode == "redirect":
+        response = download(urls["n2"], token, follow_redirects=False)
+        assert response.status_code == 307
+        assert response.headers["location"] == f"{urls['n1']}/file/download-file/{token}"
+
+    response = download(urls["n2"], token)
+    assert response.status_code == 200
+    assert response.content == b"hello from n1"
+
+
+def test_consumed_token_is_not_found_through_other_node(nodes):
+    _, urls = nodes
+    token = upload(urls["n1"])
+    assert download(urls["n2"], token).status_code == 200
+
+    # the owner removes the share in a background task after the response
+    deadline = time.monotonic() + 5
+    while (response := download(urls["n2"], token)).status_code == 200:
+        assert time.monotonic() < deadline
+        time.sleep(0.1)
+    assert response.status_code == 404
+
+
+def test_unknown_owner_is_served_locally(nodes):
+    _, urls = nodes
+    assert download(urls["n2"], "n9.unknown").status_code == 404
+
+
+def test_unreachable_owner_returns_bad_gateway(nodes):
+    mode, urls = nodes
+    if mode != "proxy":
+        pytest.skip("only the proxy contacts the owner itself")
+    response = download(urls["n2"], "n3.offline")
+    assert response.status_code == 502
+    assert "unreachable" in response.json()["detail"]
+
+
+@pytest.mark.parametrize(
+    "mode,node_id,node_urls",
+    [
+        ("sticky", "n1", {"n1": "http://n1"}),
+        ("proxy", "", {"n1": "http://n1"}),
+        ("redirect", "n2", {"n1": "http://n1"}),
+    ],
+)
+def test_check_config_rejects_invalid_setup(monkeypatch, mode, node_id, node_urls):
+    monkeypatch.setattr(affinity, "AFFINITY_MODE", mode)
+    monkeypatch.setattr(affinity, "NODE_ID", node_id)
+    monkeypatch.setattr(affinity, "NODE_URLS", node_urls)
+    with pytest.raises(RuntimeError):
+        affinity.check_config()
+
+
+def test_check_config_accepts_shared_without_node(monkeypatch):
+    monkeypatch.setattr(affinity, "AFFINITY_MODE", "shared")
+    monkeypatch.setattr(affinity, "NODE_ID", "")
+    affinity.check_config()
@@ -0,0 +1,120 @@
+import asyncio
+import os
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from src import instrumentation
+from src.instrumentation import LoopLagMonitor, RequestProfiler, TransferTracker, in_flight
+from src.routers import debug
+
+
+def block_loop():
+    time.sleep(0.5)
+
+
+def test_loop_monitor_records_stall_with_blocking_frame():
+    monitor = LoopLagMonitor(threshold_ms=100, interval_ms=20)
+
+    async def run():
+        monitor.start()
+        await asyncio.sleep(0.1)
+        block_loop()
+        await asyncio.sleep(0.1)
+        monitor.stop()
+
+    asyncio.run(run())
+
+    assert len(monitor.stalls) == 1
+    stall = monitor.stalls[0]
+    assert stall["lag_ms"] >= 400
+    assert any("block_loop" in line for line in stall["stack"])
+
+
+def test_loop_monitor_disabled_with_zero_threshold():
+    monitor = LoopLagMonitor(threshold_ms=0)
+
+    async def run():
+        monitor.start()
+        block_loop()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+
+    assert not monitor.enabled
+    assert monitor._task is None
+    assert not monitor.stalls
+
+
+def test_request_profiler_writes_profile_without_token_in_name(monkeypatch, tmp_path):
+    monkeypatch.setattr(instrumentation, "PROFILE_TOKEN", "let-me-profile")
+    monkeypatch.setattr(instrumentation, "PROFILE_DIR", str(tmp_path))
+    app = FastAPI()
+
+    @app.get("/file/download-file/{token}")
+    async def download(token: str):
+        return {"token": token}
+
+    app.add_middleware(RequestProfiler)
+    client = TestClient(app)
+
+    client.get("/file/download-file/secret-token")
+    client.get("/file/download-file/secret-token", headers={"X-Profile": "wrong"})
+    assert os.listdir(tmp_path) == []
+
+    for _ in range(2):
+        client.get("/file/download-file/secret-token", headers={"X-Profile": "let-me-profile"})
+    profiles = os.listdir(tmp_path)
+    assert len(profiles) == 2
+    assert all("secret-token" not in name for name in profiles)
+
+
+def test_transfer_tracker_counts_bytes_in_flight():
+    seen = {}
+    app = FastAPI()
+
+    @app.post("/file/upload-file")
+    async def upload(request: Request):
+        body = await request.body()
+
+        async def chunks():
+            yield b"a" * 10
+            seen.update(next(iter(in_flight.values())))
+            yield b"b" * 5
+
+        return StreamingResponse(chunks())
+
+    app.add_middleware(TransferTracker)
+    response = TestClient(app).post("/file/upload-file", content=b"x" * 1234)
+
+    assert response.content == b"a" * 10 + b"b" * 5
+    assert seen["bytes_received"] == 1234
+    assert seen["bytes_sent"] == 10
+    assert seen["path"] == "/file/upload-file"
+    assert in_flight == {}
+
+
+def test_debug_endpoints_need_debug_token(monkeypatch):
+    app = FastAPI()
+    app.include_router(debug.router)
+    client = TestClient(app)
+
+    monkeypatch.setattr(instrumentation, "DEBUG_TOKEN", None)
+    assert client.get("/debug/loop-lag", headers={"X-Debug-Token": ""}).status_code == 404
+
+    monkeypatch.setattr(instrumentation, "DEBUG_TOKEN", "s3cret")
+    assert client.get("/debug/transfers").status_code == 403
+    assert client.get("/debug/transfers", headers={"X-Debug-Token": "nope"}).status_code == 403
+    response = client.get("/debug/transfers", headers={"X-Debug-Token": "s3cret"})
+    assert response.status_code == 200
+    assert response.json() == {"in_flight": []}
+
+
+def test_debug_router_not_mounted_without_debug_token():
+    from src.main import app
+
+    assert instrumentation.DEBUG_TOKEN is None
+    response = TestClient(app).get("/debug/loop-lag", headers={"X-Debug-Token": "anything"})
+    assert response.status_code == 404
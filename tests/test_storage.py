@@ -0,0 +1,124 @@
+import os
+import threading
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import create_engine, text
+
+from src import storage
+from src.database import sessionLocal
+from src.models import Base, Share
+
+
+def test_bucket_for_uses_utc_expiry_hour():
+    aware = datetime(2025, 1, 1, 13, 59, tzinfo=timezone.utc)
+    naive = datetime(2025, 1, 1, 13, 0)
+    shifted = datetime(2025, 1, 1, 15, 30, tzinfo=timezone(timedelta(hours=2)))
+    assert storage.bucket_for(aware) == 2025010113
+    assert storage.bucket_for(naive) == 2025010113
+    assert storage.bucket_for(shifted) == 2025010113
+
+
+def test_current_bucket_is_this_hour():
+    assert storage.current_bucket() == int(datetime.now(timezone.utc).strftime("%Y%m%d%H"))
+
+
+def test_drop_expired_files_keeps_current_and_future_hours():
+    now = datetime.now(timezone.utc)
+    past = storage.bucket_for(now - timedelta(hours=2))
+    current = storage.current_bucket()
+    future = storage.bucket_for(now + timedelta(hours=24))
+    paths = {b: storage.bucket_path(b, "f.txt") for b in (past, current, future)}
+    for path in paths.values():
+        with open(path, "w") as f:
+            f.write("x")
+
+    storage.drop_expired_files(current)
+
+    assert not os.path.exists(os.path.dirname(paths[past]))
+    assert os.path.exists(paths[current])
+    assert os.path.exists(paths[future])
+
+
+def test_drop_expired_rows_removes_only_past_buckets():
+    Base.metadata.create_all(bind=storage.engine)
+    now = datetime.now(timezone.utc)
+    db = sessionLocal()
+    try:
+        db.query(Share).delete()
+        for hours in (-3, 0, 24):
+            expires = now + timedelta(hours=hours)
+            db.add(Share(file_name="f.txt", expires=expires, expiry_bucket=storage.bucket_for(expires)))
+        db.commit()
+
+        storage.drop_expired_rows(db, "filestorage", storage.current_bucket())
+
+        remaining = sorted(share.expiry_bucket for share in db.query(Share).all())
+        assert remaining == [storage.current_bucket(), storage.bucket_for(now + timedelta(hours=24))]
+    finally:
+        db.close()
+
+
+def create_old_database(path, file_path):
+    old_engine = create_engine(f"sqlite:///{path}")
+    with open(file_path, "w") as f:
+        f.write("x")
+    with old_engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE filestorage (id INTEGER PRIMARY KEY, file_name VARCHAR, file_path VARCHAR, "
+            "token VARCHAR, created DATETIME, expires DATETIME, file_type VARCHAR)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE grouptable (id INTEGER PRIMARY KEY, share_id INTEGER, receiver_email VARCHAR, "
+            "token VARCHAR, created DATETIME, expires DATETIME)"
+        ))
+        conn.execute(text(
+            "INSERT INTO filestorage (id, file_path, expires) VALUES (1, :path, '2025-01-01 13:30:00.000000')"
+        ), {"path": file_path})
+        conn.execute(text(
+            "INSERT INTO grouptable (id, share_id, expires) VALUES (1, 1, '2025-01-01 13:30:00.000000')"
+        ))
+    return old_engine
+
+
+def assert_upgraded(old_engine, file_name):
+    with old_engine.connect() as conn:
+        bucket, file_path = conn.execute(text("SELECT expiry_bucket, file_path FROM filestorage")).one()
+        group_bucket = conn.execute(text("SELECT expiry_bucket FROM grouptable")).scalar()
+    assert bucket == group_bucket == 2025010113
+    assert file_path == os.path.join(storage.UPLOAD_DIR, "2025010113", file_name)
+    assert os.path.exists(file_path)
+
+
+def test_upgrade_schema_backfills_old_sqlite_database(tmp_path):
+    flat_file = os.path.join(storage.UPLOAD_DIR, "old_upload.txt")
+    old_engine = create_old_database(tmp_path / "old.db", flat_file)
+
+    storage.upgrade_schema(old_engine)
+    storage.upgrade_schema(old_engine)  # a second start is a no-op
+
+    assert_upgraded(old_engine, "old_upload.txt")
+    assert not os.path.exists(flat_file)
+
+
+def test_upgrade_schema_from_replicas_starting_together(tmp_path):
+    flat_file = os.path.join(storage.UPLOAD_DIR, "shared_upload.txt")
+    create_old_database(tmp_path / "shared.db", flat_file)
+    # one engine per replica, all on the same app.db
+    engines = [create_engine(f"sqlite:///{tmp_path / 'shared.db'}") for _ in range(3)]
+    barrier = threading.Barrier(len(engines))
+    errors = []
+
+    def start_replica(replica_engine):
+        barrier.wait()
+        try:
+            storage.upgrade_schema(replica_engine)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=start_replica, args=(e,)) for e in engines]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert_upgraded(engines[0], "shared_upload.txt")